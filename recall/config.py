@@ -1,7 +1,39 @@
 from __future__ import annotations
 from dataclasses import dataclass, field
-from typing import Iterable, List, Pattern
+from typing import FrozenSet, Iterable, List, Pattern, Tuple
 import re
+_SCOPED_FLAGS = ((re.IGNORECASE, 'i'), (re.MULTILINE, 'm'), (re.DOTALL, 's'), (re.VERBOSE, 'x'))
+_FUSABLE_FLAGS = re.IGNORECASE | re.MULTILINE | re.DOTALL | re.VERBOSE | re.UNICODE
+_GROUP_REF = re.compile('\\\\[1-9]|\\(\\?P=|\\(\\?\\(')
+
+def _scoped(rx: Pattern[str]) -> str:
+    flags = ''.join((ch for (fl, ch) in _SCOPED_FLAGS if rx.flags & fl))
+    tail = '\n' if rx.flags & re.VERBOSE else ''
+    return f'(?{flags}:{rx.pattern}{tail})'
+
+def _fusable(rx: Pattern[str]) -> bool:
+    return isinstance(rx.pattern, str) and (not rx.flags & ~_FUSABLE_FLAGS) and (_GROUP_REF.search(rx.pattern) is None)
+
+def _fuse_patterns(patterns: Iterable[Pattern[str]]) -> Tuple[Pattern[str], ...]:
+    rxs = tuple(patterns or ())
+    if len(rxs) <= 1 or not all(map(_fusable, rxs)):
+        return rxs
+    try:
+        return (re.compile('|'.join((_scoped(rx) for rx in rxs))),)
+    except re.error:
+        return rxs
+
+def _search_any(rxs: Tuple[Pattern[str], ...], s: str) -> bool:
+    for rx in rxs:
+        if rx.search(s) is not None:
+            return True
+    return False
+
+def _contains_any(s: str, keywords: Tuple[str, ...]) -> bool:
+    for kw in keywords:
+        if kw in s:
+            return True
+    return False
 
 @dataclass(frozen=True)
 class RecallConfig:
@@ -35,28 +67,58 @@ class RecallConfig:
     llm_endpoint: str = '..'
     llm_backend: str = 'deepseek_api'
     llm_local_model_path: str | None = None
+    llm_quantization: str | None = None
+    llm_batch_size: int = 1
+    record_prompt_len: bool = False
     trigger_keywords: List[str] = field(default_factory=lambda : ['fatal', 'panic', 'exception', 'critical', 'failure', 'machine check'])
     severity_keywords_fatal: List[str] = field(default_factory=lambda : ['fatal', 'panic', 'critical', 'machine check'])
     severity_keywords_error: List[str] = field(default_factory=lambda : ['error', 'exception', 'fail', 'failure', 'crash', 'abort', 'terminated'])
     entity_blacklist_exact: List[str] = field(default_factory=lambda : ['127.0.0.1', '0.0.0.0', 'localhost', '/tmp'])
     entity_blacklist_regex: List[Pattern[str]] = field(default_factory=lambda : [re.compile('^::1$')])
-    token_drop_regex: List[Pattern[str]] = field(default_factory=lambda : [re.compile('^\\\\d{4}-\\\\d{2}-\\\\d{2}-\\\\d{2}\\\\.\\\\d{2}\\\\.\\\\d{2}\\\\.\\\\d+$')])
+    token_drop_regex: List[Pattern[str]] = field(default_factory=lambda : [re.compile('^\\d{4}-\\d{2}-\\d{2}-\\d{2}\\.\\d{2}\\.\\d{2}\\.\\d+$')])
+    _exact_set: FrozenSet[str] = field(init=False, repr=False, compare=False)
+    _blacklist_res: Tuple[Pattern[str], ...] = field(init=False, repr=False, compare=False)
+    _token_drop_res: Tuple[Pattern[str], ...] = field(init=False, repr=False, compare=False)
+    _trigger_kws: Tuple[str, ...] = field(init=False, repr=False, compare=False)
+    _severity_fatal_kws: Tuple[str, ...] = field(init=False, repr=False, compare=False)
+    _severity_error_kws: Tuple[str, ...] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, '_exact_set', frozenset(self.entity_blacklist_exact or []))
+        object.__setattr__(self, '_blacklist_res', _fuse_patterns(self.entity_blacklist_regex))
+        object.__setattr__(self, '_token_drop_res', _fuse_patterns(self.token_drop_regex))
+        object.__setattr__(self, '_trigger_kws', tuple(self.trigger_keywords or ()))
+        object.__setattr__(self, '_severity_fatal_kws', tuple(self.severity_keywords_fatal or ()))
+        object.__setattr__(self, '_severity_error_kws', tuple(self.severity_keywords_error or ()))
+
+    def has_trigger(self, msg: str) -> bool:
+        return _contains_any((msg or '').lower(), self._trigger_kws)
+
+    def severity_of(self, msg: str) -> int:
+        s = (msg or '').lower()
+        if _contains_any(s, self._severity_fatal_kws):
+            return 3
+        if _contains_any(s, self._severity_error_kws):
+            return 2
+        if 'warn' in s:
+            return 1
+        return 0
+
+    def is_exact_blacklisted(self, ent: str) -> bool:
+        return ent in self._exact_set
+
+    def matches_blacklist_regex(self, ent: str) -> bool:
+        return _search_any(self._blacklist_res, ent)
 
     def is_blacklisted_entity(self, ent: str) -> bool:
         s = (ent or '').strip()
         if not s:
             return True
-        if s in self.entity_blacklist_exact:
+        if s in self._exact_set:
             return True
-        for rx in self.entity_blacklist_regex:
-            if rx.search(s):
-                return True
-        return False
+        return _search_any(self._blacklist_res, s)
 
     def should_drop_token(self, token: str) -> bool:
         if not token:
             return True
-        for rx in self.token_drop_regex:
-            if rx.search(token):
-                return True
-        return False
+        return _search_any(self._token_drop_res, token)
@@ -5,7 +5,7 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, Iterable, Iterator, List, Optional
 
-@dataclass
+@dataclass(slots=True)
 class LogRecord:
     log_id: int
     ts_sec: int
@@ -13,28 +13,32 @@ class LogRecord:
     true_label: int
 
 def _read_labeled_loghub_file(path: Path) -> List[LogRecord]:
-    out: List[LogRecord] = []
-    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+    ts_col: List[int] = []
+    msg_col: List[str] = []
+    label_col: List[int] = []
+    (add_ts, add_msg, add_label) = (ts_col.append, msg_col.append, label_col.append)
+    with open(path, 'r', encoding='utf-8', errors='ignore', buffering=1 << 20) as f:
         for line in f:
             s = line.strip()
             if not s:
                 continue
-            pos = s.find(' ')
-            if pos < 0:
+            parts = s.split(' ', 2)
+            if len(parts) < 2:
                 continue
-            raw_label = s[:pos]
-            rest = s[pos + 1:]
-            parts = s.split(' ')
+            raw_label = parts[0]
             try:
                 ts = int(parts[1])
             except Exception:
                 ts = 0
-            true = 0 if raw_label == '-' else 1
-            out.append(LogRecord(log_id=-1, ts_sec=ts, message=rest, true_label=true))
-    out.sort(key=lambda r: r.ts_sec)
-    for (i, r) in enumerate(out):
-        r.log_id = i
-    return out
+            add_ts(ts)
+            add_msg(s[len(raw_label) + 1:])
+            add_label(0 if raw_label == '-' else 1)
+    n = len(ts_col)
+    if all((ts_col[i] <= ts_col[i + 1] for i in range(n - 1))):
+        order: Iterable[int] = range(n)
+    else:
+        order = sorted(range(n), key=ts_col.__getitem__)
+    return [LogRecord(log_id=i, ts_sec=ts_col[j], message=msg_col[j], true_label=label_col[j]) for (i, j) in enumerate(order)]
 
 def load_dataset(dataset: str, loghub_root: Optional[str]=None) -> List[LogRecord]:
     ds = (dataset or '').strip().lower()
@@ -1,13 +1,12 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from collections import deque, defaultdict
-from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple
+from bisect import bisect_left
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
 import math
 from .config import RecallConfig
-from .entity_extraction import classify_entity_type
+from .text import normalize_message_for_dedup
+_BETA_TABLE_SIZE = 1024
 
-@dataclass
-class LogNode:
+class LogView(NamedTuple):
     log_id: int
     ts_sec: int
     message: str
@@ -15,25 +14,36 @@ class LogNode:
     prev_log_id: Optional[int] = None
     next_log_id: Optional[int] = None
 
-@dataclass
-class EntityNode:
-    value: str
-    etype: str
-    activity: float = 0.0
-    last_step: int = 0
-    last_seen_ts: int = 0
-
 class DynamicLogEntityGraph:
 
     def __init__(self, cfg: RecallConfig) -> None:
         self.cfg = cfg
         self._step = 0
-        self.logs: Dict[int, LogNode] = {}
-        self.entities: Dict[str, EntityNode] = {}
-        self.log_to_entities: Dict[int, Set[str]] = {}
-        self.entity_to_logs: Dict[str, Deque[int]] = defaultdict(deque)
-        self._log_window: Deque[int] = deque()
+        self._row_of: Dict[int, int] = {}
+        self._row_base = 0
+        self._head = 0
+        self._pruned_row = 0
+        self._ts_monotone = True
+        self._edge_epoch = 0
+        self._log_id: List[Optional[int]] = []
+        self._log_ts: List[int] = []
+        self._log_sev: List[int] = []
+        self._log_msg: List[str] = []
+        self._log_dedup: List[Optional[int]] = []
+        self._log_prev: List[Optional[int]] = []
+        self._log_next: List[Optional[int]] = []
+        self._log_ents: List[Set[int]] = []
+        self._ent_index: Dict[str, int] = {}
+        self._ent_values: List[str] = []
+        self._ent_activity: List[float] = []
+        self._ent_last_step: List[int] = []
+        self._ent_free: List[int] = []
+        self._ent_logs: List[Dict[int, None]] = []
         self._last_log_id: Optional[int] = None
+        self._lam = self._lambda()
+        self._age_limit = self._edge_age_limit()
+        self._beta = float(cfg.activity_beta)
+        self._beta_powers = [self._beta ** d for d in range(_BETA_TABLE_SIZE)]
 
     def _lambda(self) -> float:
         lam = self.cfg.decay_lambda
@@ -48,39 +58,118 @@ class DynamicLogEntityGraph:
         except Exception:
             return 0.0
 
+    def _edge_age_limit(self) -> int:
+        theta_w = float(self.cfg.theta_w)
+        if theta_w <= 0 or self._lam <= 0:
+            return 0
+        return int(math.ceil(-math.log(theta_w) / self._lam))
+
+    def _decay(self, dt_steps: int) -> float:
+        if dt_steps < _BETA_TABLE_SIZE:
+            return self._beta_powers[dt_steps]
+        return self._beta ** dt_steps
+
     @property
     def step(self) -> int:
         return self._step
 
+    @property
+    def edge_epoch(self) -> int:
+        return self._edge_epoch
+
+    def _idx(self, log_id: Optional[int]) -> int:
+        row = self._row_of.get(log_id)
+        return -1 if row is None else row - self._row_base
+
     def _edge_weight(self, edge_last_ts: int, now_ts: int) -> float:
         dt = max(0, int(now_ts) - int(edge_last_ts))
-        lam = self._lambda()
+        lam = self._lam
         if lam <= 0:
             return 1.0
         return math.exp(-lam * dt)
 
-    def structural_edge_weight(self, log_id: int, entity: str, now_ts: int) -> float:
-        ln = self.logs.get(log_id)
-        if not ln:
+    def log_edge_weight(self, log_id: int, now_ts: int) -> float:
+        row = self._row_of.get(log_id)
+        if row is None:
             return 0.0
-        return self._edge_weight(ln.ts_sec, now_ts)
+        return self._edge_weight(self._log_ts[row - self._row_base], now_ts)
+
+    def structural_edge_weight(self, log_id: int, entity: str, now_ts: int) -> float:
+        return self.log_edge_weight(log_id, now_ts)
 
     def temporal_edge_weight(self, src_log_id: int, dst_log_id: int, now_ts: int) -> float:
-        ln = self.logs.get(dst_log_id)
-        if not ln:
+        return self.log_edge_weight(dst_log_id, now_ts)
+
+    def edge_weights_bulk(self, log_ids: Iterable[int], now_ts: int) -> List[float]:
+        (row_of, base, ts_col) = (self._row_of, self._row_base, self._log_ts)
+        now = int(now_ts)
+        lam = self._lam
+        out: List[float] = []
+        for lid in log_ids:
+            row = row_of.get(lid)
+            if row is None:
+                out.append(0.0)
+            elif lam <= 0:
+                out.append(1.0)
+            else:
+                out.append(math.exp(-lam * max(0, now - ts_col[row - base])))
+        return out
+
+    def temporal_neighbors(self, log_id: int, k: int) -> Dict[int, int]:
+        i = self._idx(log_id)
+        out: Dict[int, int] = {}
+        if i < 0 or k <= 0:
+            return out
+        (ids, prev, nxt) = (self._log_id, self._log_prev, self._log_next)
+        lo = i
+        while i - lo < k and prev[lo] is not None:
+            lo -= 1
+            out[ids[lo]] = i - lo
+        hi = i
+        while hi - i < k and nxt[hi] is not None:
+            hi += 1
+            out[ids[hi]] = hi - i
+        return out
+
+    def temporal_path_min_edge_weight(self, src_log_id: int, dst_log_id: int, now_ts: int, max_hops: int=2048) -> float:
+        if src_log_id == dst_log_id:
+            return 1.0
+        (si, di) = (self._idx(src_log_id), self._idx(dst_log_id))
+        if si < 0 or di < 0 or abs(di - si) > max_hops:
             return 0.0
-        return self._edge_weight(ln.ts_sec, now_ts)
+        (lo, hi) = (si, di) if si < di else (di, si)
+        if self._ts_monotone:
+            if lo + 1 < self._pruned_row - self._row_base:
+                return 0.0
+            oldest = self._log_ts[lo + 1]
+        else:
+            if None in self._log_prev[lo + 1:hi + 1]:
+                return 0.0
+            oldest = min(self._log_ts[lo + 1:hi + 1])
+        lam = self._lam
+        if lam <= 0:
+            return 1.0
+        return math.exp(-lam * max(0, int(now_ts) - oldest))
 
     def add_log(self, log_id: int, ts_sec: int, message: str, entities: Iterable[str], severity: int) -> None:
         self._step += 1
         ts = int(ts_sec)
-        node = LogNode(log_id=log_id, ts_sec=ts, message=message or '', severity=int(severity))
-        self.logs[log_id] = node
-        self._log_window.append(log_id)
-        if self._last_log_id is not None and self._last_log_id in self.logs:
-            prev = self.logs[self._last_log_id]
-            prev.next_log_id = log_id
-            node.prev_log_id = prev.log_id
+        prev_id = None
+        pi = self._idx(self._last_log_id)
+        if pi >= 0:
+            self._log_next[pi] = log_id
+            prev_id = self._last_log_id
+        if self._log_ts and ts < self._log_ts[-1]:
+            self._ts_monotone = False
+        self._row_of[log_id] = self._row_base + len(self._log_id)
+        self._log_id.append(log_id)
+        self._log_ts.append(ts)
+        self._log_sev.append(int(severity))
+        self._log_msg.append(message or '')
+        dedup = normalize_message_for_dedup(message, case_insensitive=self.cfg.dedup_case_insensitive)
+        self._log_dedup.append(hash(dedup) if dedup else None)
+        self._log_prev.append(prev_id)
+        self._log_next.append(None)
         self._last_log_id = log_id
         ent_set: Set[str] = set()
         for e in entities:
@@ -90,23 +179,46 @@ class DynamicLogEntityGraph:
             if self.cfg.is_blacklisted_entity(e2):
                 continue
             ent_set.add(e2)
-        self.log_to_entities[log_id] = ent_set
+        ent_ids: Set[int] = set()
         for e in ent_set:
-            en = self.entities.get(e)
-            if en is None:
-                en = EntityNode(value=e, etype=classify_entity_type(e), activity=0.0, last_step=self._step, last_seen_ts=ts)
-                self.entities[e] = en
-            self._activate_entity(en, ts_sec=ts)
-            self.entity_to_logs[e].append(log_id)
-
-    def _activate_entity(self, en: EntityNode, ts_sec: int) -> None:
-        dt_steps = max(0, self._step - int(en.last_step))
-        beta = float(self.cfg.activity_beta)
+            i = self._entity_slot(e)
+            self._activate_entity(i)
+            self._ent_logs[i][log_id] = None
+            ent_ids.add(i)
+        self._log_ents.append(ent_ids)
+
+    def _entity_slot(self, entity: str) -> int:
+        i = self._ent_index.get(entity)
+        if i is not None:
+            return i
+        if self._ent_free:
+            i = self._ent_free.pop()
+            self._ent_values[i] = entity
+            self._ent_activity[i] = 0.0
+            self._ent_last_step[i] = self._step
+            self._ent_logs[i] = {}
+        else:
+            i = len(self._ent_values)
+            self._ent_values.append(entity)
+            self._ent_activity.append(0.0)
+            self._ent_last_step.append(self._step)
+            self._ent_logs.append({})
+        self._ent_index[entity] = i
+        return i
+
+    def _drop_entity(self, i: int) -> None:
+        if self._ent_index.pop(self._ent_values[i], None) is None:
+            return
+        self._ent_values[i] = ''
+        self._ent_logs[i] = {}
+        self._ent_free.append(i)
+
+    def _activate_entity(self, i: int) -> None:
+        dt_steps = max(0, self._step - self._ent_last_step[i])
         if dt_steps > 0:
-            en.activity = en.activity * beta ** dt_steps
-        en.activity = en.activity + float(self.cfg.activity_alpha)
-        en.last_step = self._step
-        en.last_seen_ts = int(ts_sec)
+            self._ent_activity[i] = self._ent_activity[i] * self._decay(dt_steps)
+        self._ent_activity[i] = self._ent_activity[i] + float(self.cfg.activity_alpha)
+        self._ent_last_step[i] = self._step
 
     def tick(self, now_ts_sec: int) -> None:
         now = int(now_ts_sec)
@@ -118,80 +230,94 @@ class DynamicLogEntityGraph:
         if self.cfg.graph_window_t_sec <= 0:
             return
         cutoff = now_ts - int(self.cfg.graph_window_t_sec)
-        while self._log_window and self.logs.get(self._log_window[0]) and (self.logs[self._log_window[0]].ts_sec < cutoff):
-            lid = self._log_window.popleft()
-            self._remove_log(lid)
+        if self._ts_monotone:
+            hi = bisect_left(self._log_ts, cutoff, self._head)
+            for i in range(self._head, hi):
+                lid = self._log_id[i]
+                if lid is not None:
+                    self._remove_log(lid)
+            self._head = hi
+        else:
+            n = len(self._log_id)
+            while self._head < n:
+                lid = self._log_id[self._head]
+                if lid is not None:
+                    if self._log_ts[self._head] >= cutoff:
+                        break
+                    self._remove_log(lid)
+                self._head += 1
+        self._compact()
+
+    def _compact(self) -> None:
+        h = self._head
+        if h < 1024 or 2 * h < len(self._log_id):
+            return
+        for col in (self._log_id, self._log_ts, self._log_sev, self._log_msg, self._log_dedup, self._log_prev, self._log_next, self._log_ents):
+            del col[:h]
+        self._row_base += h
+        self._head = 0
 
     def _remove_log(self, log_id: int) -> None:
-        ln = self.logs.pop(log_id, None)
-        ents = self.log_to_entities.pop(log_id, set())
-        if ln is not None:
-            if ln.prev_log_id is not None and ln.prev_log_id in self.logs:
-                self.logs[ln.prev_log_id].next_log_id = ln.next_log_id
-            if ln.next_log_id is not None and ln.next_log_id in self.logs:
-                self.logs[ln.next_log_id].prev_log_id = ln.prev_log_id
-            if self._last_log_id == log_id:
-                self._last_log_id = ln.prev_log_id
+        i = self._idx(log_id)
+        if i < 0:
+            return
+        prev_id = self._log_prev[i]
+        next_id = self._log_next[i]
+        pi = self._idx(prev_id)
+        if pi >= 0:
+            self._log_next[pi] = next_id
+        ni = self._idx(next_id)
+        if ni >= 0:
+            self._log_prev[ni] = prev_id
+        if self._last_log_id == log_id:
+            self._last_log_id = prev_id
+        ents = self._log_ents[i]
+        del self._row_of[log_id]
+        self._log_id[i] = None
+        self._log_msg[i] = ''
+        self._log_dedup[i] = None
+        self._log_prev[i] = None
+        self._log_next[i] = None
+        self._log_ents[i] = set()
+        if ents:
+            self._edge_epoch += 1
         for e in ents:
-            dq = self.entity_to_logs.get(e)
-            if not dq:
-                continue
-            try:
-                while dq and dq[0] == log_id:
-                    dq.popleft()
-            except Exception:
-                pass
-            if dq and log_id in dq:
-                self.entity_to_logs[e] = deque([x for x in dq if x != log_id])
-            if not self.entity_to_logs[e]:
-                self.entity_to_logs.pop(e, None)
-                self.entities.pop(e, None)
+            posting = self._ent_logs[e]
+            posting.pop(log_id, None)
+            if not posting:
+                self._drop_entity(e)
 
     def _prune_edges(self, now_ts: int) -> None:
-        theta_w = float(self.cfg.theta_w)
-        if theta_w <= 0:
-            return
-        lam = self._lambda()
-        if lam <= 0:
-            return
-        age_limit = int(math.ceil(-math.log(theta_w) / lam))
+        age_limit = self._age_limit
         if age_limit <= 0:
             return
         cutoff_ts = now_ts - age_limit
-        for lid in list(self._log_window):
-            ln = self.logs.get(lid)
-            if ln is None:
-                continue
-            if ln.ts_sec >= cutoff_ts:
+        ts_col = self._log_ts
+        if self._ts_monotone:
+            lo = max(self._head, self._pruned_row - self._row_base)
+            hi = bisect_left(ts_col, cutoff_ts, lo)
+            rows: Iterable[int] = range(lo, hi)
+            self._pruned_row = self._row_base + hi
+        else:
+            rows = [i for i in range(self._head, len(ts_col)) if ts_col[i] < cutoff_ts]
+        for i in rows:
+            lid = self._log_id[i]
+            if lid is None:
                 continue
-            ents = self.log_to_entities.get(lid)
-            if not ents:
-                continue
-            for e in list(ents):
-                dq = self.entity_to_logs.get(e)
-                if dq:
-                    if lid in dq:
-                        self.entity_to_logs[e] = deque([x for x in dq if x != lid])
-                    if not self.entity_to_logs[e]:
-                        self.entity_to_logs.pop(e, None)
-                        self.entities.pop(e, None)
-            self.log_to_entities[lid] = set()
-        for lid in list(self._log_window):
-            ln = self.logs.get(lid)
-            if ln is None or ln.prev_log_id is None:
-                continue
-            if ln.ts_sec < cutoff_ts:
-                prev = self.logs.get(ln.prev_log_id)
-                if prev is not None:
-                    prev.next_log_id = None
-                ln.prev_log_id = None
-
-    def _entity_activity_now(self, en: EntityNode) -> float:
-        dt_steps = max(0, self._step - int(en.last_step))
-        beta = float(self.cfg.activity_beta)
-        if dt_steps <= 0:
-            return float(en.activity)
-        return float(en.activity) * beta ** dt_steps
+            ents = self._log_ents[i]
+            if ents:
+                self._edge_epoch += 1
+                for e in ents:
+                    posting = self._ent_logs[e]
+                    posting.pop(lid, None)
+                    if not posting:
+                        self._drop_entity(e)
+                self._log_ents[i] = set()
+            if self._log_prev[i] is not None:
+                pi = self._idx(self._log_prev[i])
+                if pi >= 0:
+                    self._log_next[pi] = None
+                self._log_prev[i] = None
 
     def _prune_entities_by_activity(self) -> None:
         eps = float(self.cfg.activity_epsilon)
@@ -199,29 +325,102 @@ class DynamicLogEntityGraph:
             return
         if self._step % 256 != 0:
             return
-        to_drop: List[str] = []
-        for (e, en) in self.entities.items():
-            if self._entity_activity_now(en) < eps:
-                to_drop.append(e)
+        step = self._step
+        act = self._ent_activity
+        live = list(self._ent_index.values())
+        ages = [max(0, step - self._ent_last_step[i]) for i in live]
+        decay = {d: self._decay(d) for d in set(ages)}
+        to_drop = [i for (i, d) in zip(live, ages) if act[i] * decay[d] < eps]
+        if to_drop:
+            self._edge_epoch += 1
         for e in to_drop:
-            for lid in list(self.entity_to_logs.get(e, deque())):
-                if lid in self.log_to_entities:
-                    self.log_to_entities[lid].discard(e)
-            self.entity_to_logs.pop(e, None)
-            self.entities.pop(e, None)
+            for lid in self._ent_logs[e]:
+                i = self._idx(lid)
+                if i >= 0:
+                    self._log_ents[i].discard(e)
+            self._drop_entity(e)
+
+    def get_log(self, log_id: int) -> Optional[LogView]:
+        i = self._idx(log_id)
+        if i < 0:
+            return None
+        return LogView(log_id, self._log_ts[i], self._log_msg[i], self._log_sev[i], self._log_prev[i], self._log_next[i])
 
-    def get_log(self, log_id: int) -> Optional[LogNode]:
-        return self.logs.get(log_id)
+    def log_ts(self, log_id: int) -> Optional[int]:
+        row = self._row_of.get(log_id)
+        return None if row is None else self._log_ts[row - self._row_base]
+
+    def log_severity(self, log_id: int) -> Optional[int]:
+        row = self._row_of.get(log_id)
+        return None if row is None else self._log_sev[row - self._row_base]
+
+    def log_message(self, log_id: int) -> Optional[str]:
+        row = self._row_of.get(log_id)
+        return None if row is None else self._log_msg[row - self._row_base]
+
+    @property
+    def end_row(self) -> int:
+        return self._row_base + len(self._log_id)
+
+    def log_row(self, log_id: int) -> Optional[int]:
+        return self._row_of.get(log_id)
+
+    def logs_in_rows(self, row_lo: int, row_hi: int) -> List[Tuple[int, int, Set[int]]]:
+        base = self._row_base
+        (ids, ts_col, ents) = (self._log_id, self._log_ts, self._log_ents)
+        lo = max(self._head, row_lo - base)
+        hi = min(len(ids), row_hi - base)
+        return [(ids[i], ts_col[i], ents[i]) for i in range(lo, hi) if ids[i] is not None]
+
+    def dedup_key(self, log_id: int) -> Optional[int]:
+        row = self._row_of.get(log_id)
+        return None if row is None else self._log_dedup[row - self._row_base]
+
+    def prev_log_id(self, log_id: int) -> Optional[int]:
+        row = self._row_of.get(log_id)
+        return None if row is None else self._log_prev[row - self._row_base]
+
+    def next_log_id(self, log_id: int) -> Optional[int]:
+        row = self._row_of.get(log_id)
+        return None if row is None else self._log_next[row - self._row_base]
 
     def get_entities_for_log(self, log_id: int) -> Set[str]:
-        return set(self.log_to_entities.get(log_id, set()))
+        i = self._idx(log_id)
+        if i < 0:
+            return set()
+        values = self._ent_values
+        return {values[e] for e in self._log_ents[i]}
+
+    def entity_ids_for_log(self, log_id: int) -> Set[int]:
+        i = self._idx(log_id)
+        return set(self._log_ents[i]) if i >= 0 else set()
+
+    def entity_value(self, entity_id: int) -> str:
+        return self._ent_values[entity_id]
 
     def get_logs_for_entity(self, entity: str) -> List[int]:
-        dq = self.entity_to_logs.get(entity)
-        if not dq:
+        i = self._ent_index.get(entity)
+        return [] if i is None else list(self._ent_logs[i])
+
+    def recent_logs_for_entity_id(self, entity_id: int, since_ts: Optional[int]=None) -> List[int]:
+        posting = self._ent_logs[entity_id]
+        if not posting:
             return []
-        return list(dq)
+        if since_ts is None:
+            return list(reversed(posting))
+        (row_of, base, ts_col, monotone) = (self._row_of, self._row_base, self._log_ts, self._ts_monotone)
+        out: List[int] = []
+        for lid in reversed(posting):
+            if ts_col[row_of[lid] - base] < since_ts:
+                if monotone:
+                    break
+                continue
+            out.append(lid)
+        return out
 
     def entity_degree(self, entity: str) -> int:
-        dq = self.entity_to_logs.get(entity)
-        return len(dq) if dq else 0
+        i = self._ent_index.get(entity)
+        return 0 if i is None else len(self._ent_logs[i])
+
+    def entity_id_degree(self, entity_id: int) -> int:
+        return len(self._ent_logs[entity_id])
@@ -1,39 +1,62 @@
 from __future__ import annotations
+import hashlib
 import json
 import re
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import Dict, Optional, Set, Tuple, Iterable, Any
+from typing import Any, Dict, Iterable, List, Optional, Pattern, Set, Tuple
 from .config import RecallConfig
+from .fastjson import json_object_span, loads
 from .recurrence import TokenRecurrenceCounter
 from .text import tokenize_for_entity_candidates, token_complexity
 _IPV4_PORT = re.compile('^(?P<ip>(?:\\d{1,3}\\.){3}\\d{1,3})(?::\\d{1,5})?$')
+_TC_CACHE_MAX = 1 << 16
+_CLASSIFY_RE = re.compile('(?P<ip>^(?:\\d{1,3}\\.){3}\\d{1,3}(?::\\d{1,5})?$)|(?P<path>^\\.?/)|(?P<block_id>^blk_)|(?P<identifier>^[A-Za-z]\\w*-\\w+)|(?P<number>^\\d+$)|(?P<code>^[A-Z0-9_]{3,}$)')
+_RE_DIGIT = re.compile('(?P<ip>(?:\\d{1,3}\\.){3}\\d{1,3}(?::\\d{1,5})?$)|(?P<number>\\d+$)|(?P<code>[A-Z0-9_]{3,}$)')
+_RE_UPPER = re.compile('(?P<identifier>[A-Za-z]\\w*-\\w+)|(?P<code>[A-Z0-9_]{3,}$)')
+_RE_LOWER = re.compile('(?P<identifier>[A-Za-z]\\w*-\\w+)')
+_RE_B = re.compile('(?P<block_id>blk_)|(?P<identifier>[A-Za-z]\\w*-\\w+)')
+_RE_UNDERSCORE = re.compile('(?P<code>[A-Z0-9_]{3,}$)')
+_RE_SLASH = re.compile('(?P<path>/)')
+_RE_DOT = re.compile('(?P<path>\\./)')
+
+def _build_dispatch() -> List[Optional[Pattern[str]]]:
+    table: List[Optional[Pattern[str]]] = [None] * 128
+    for ch in '0123456789':
+        table[ord(ch)] = _RE_DIGIT
+    for ch in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ':
+        table[ord(ch)] = _RE_UPPER
+    for ch in 'abcdefghijklmnopqrstuvwxyz':
+        table[ord(ch)] = _RE_LOWER
+    table[ord('b')] = _RE_B
+    table[ord('_')] = _RE_UNDERSCORE
+    table[ord('/')] = _RE_SLASH
+    table[ord('.')] = _RE_DOT
+    return table
+_DISPATCH = _build_dispatch()
 
 def classify_entity_type(ent: str) -> str:
     s = (ent or '').strip()
     if not s:
         return 'unknown'
-    if _IPV4_PORT.match(s):
-        return 'ip'
-    if s.startswith('/') or s.startswith('./'):
-        return 'path'
-    if s.startswith('blk_'):
-        return 'block_id'
-    if re.match('^[A-Za-z]\\w*-\\w+', s):
-        return 'identifier'
-    if re.match('^\\d+$', s):
-        return 'number'
-    if re.match('^[A-Z0-9_]{3,}$', s):
-        return 'code'
-    return 'token'
-
-@dataclass
+    c = ord(s[0])
+    if c < 128:
+        rx = _DISPATCH[c]
+        if rx is None:
+            return 'token'
+    else:
+        rx = _CLASSIFY_RE
+    m = rx.match(s)
+    return m.lastgroup if m else 'token'
+
+@dataclass(slots=True)
 class EntityExtractionResult:
     estat: Set[str]
     esem: Set[str]
     final: Set[str]
     estat_validated: Set[str] = field(default_factory=set)
 
-@dataclass
+@dataclass(slots=True)
 class SemanticValidationResult:
     keep: Set[str]
     add: Set[str]
@@ -81,10 +104,10 @@ def parse_semantic_validation_response(text: str, message: str) -> SemanticValid
     add: Set[str] = set()
     drop: Set[str] = set()
     try:
-        if '{' not in raw or '}' not in raw:
+        js = json_object_span(raw)
+        if js is None:
             return SemanticValidationResult(keep=set(), add=set(), drop=set())
-        js = raw[raw.index('{'):raw.rindex('}') + 1]
-        obj = json.loads(js)
+        obj = loads(js)
         if isinstance(obj, dict):
             if any((k in obj for k in ('keep', 'add', 'drop'))):
                 keep = _extract_values(obj.get('keep'))
@@ -109,41 +132,59 @@ class StatisticalEntityExtractor:
     def __init__(self, cfg: RecallConfig) -> None:
         self.cfg = cfg
         self.rf_counter = TokenRecurrenceCounter(window_sec=cfg.delta_t_sec)
+        self._tc_cache: Dict[str, int] = {}
 
     def extract(self, ts_sec: int, message: str) -> Set[str]:
-        toks = tokenize_for_entity_candidates(message)
+        toks = set(tokenize_for_entity_candidates(message))
         self.rf_counter.push(int(ts_sec), toks)
+        cfg = self.cfg
+        (min_len, theta_tc, theta_rf) = (cfg.min_token_len, cfg.theta_tc, cfg.theta_rf)
+        is_exact = cfg.is_exact_blacklisted
+        bl_match = cfg.matches_blacklist_regex
+        drop = cfg.should_drop_token
+        match_ip = _IPV4_PORT.match
+        rf = self.rf_counter.rf
+        tc_cache = self._tc_cache
+        if len(tc_cache) > _TC_CACHE_MAX:
+            tc_cache.clear()
         ents: Set[str] = set()
+        add = ents.add
         for tok in toks:
-            if not tok or len(tok) < self.cfg.min_token_len:
+            if not tok or len(tok) < min_len:
                 continue
-            if self.cfg.should_drop_token(tok):
+            if ':' not in tok and is_exact(tok):
                 continue
-            m = _IPV4_PORT.match(tok)
+            if drop(tok):
+                continue
+            m = match_ip(tok)
             if m:
                 ip_only = m.group('ip')
-                if ip_only and (not self.cfg.is_blacklisted_entity(ip_only)):
-                    ents.add(ip_only)
-            if self.cfg.is_blacklisted_entity(tok):
+                if ip_only and (not is_exact(ip_only)) and (not bl_match(ip_only)):
+                    add(ip_only)
+            tc = tc_cache.get(tok)
+            if tc is None:
+                tc = tc_cache[tok] = token_complexity(tok, case_sensitive=False)
+            if tc <= theta_tc or rf(tok) <= theta_rf:
+                continue
+            if is_exact(tok) or bl_match(tok):
                 continue
-            tc = token_complexity(tok, case_sensitive=False)
-            rf = self.rf_counter.rf(tok)
-            if tc > self.cfg.theta_tc and rf > self.cfg.theta_rf:
-                ents.add(tok)
+            add(tok)
         return ents
 
 class SemanticEntityExtractor:
 
-    def __init__(self, cfg: RecallConfig, backend: str, api_key: Optional[str]=None, api_key_file: Optional[str]=None, local_model_path: Optional[str]=None) -> None:
+    def __init__(self, cfg: RecallConfig, backend: str, api_key: Optional[str]=None, api_key_file: Optional[str]=None, local_model_path: Optional[str]=None, cache_size: int=4096) -> None:
         from .llm_client import DeepSeekClient, LocalHfClient
         self.cfg = cfg
+        self.cache_size = int(cache_size)
+        self._cache: OrderedDict[bytes, str] = OrderedDict()
         b = (backend or '').strip().lower()
         if b in ('deepseek', 'deepseek_api', 'api'):
             self.client = DeepSeekClient(api_key=api_key, api_key_file=api_key_file, endpoint=cfg.llm_endpoint, model=cfg.llm_model_name)
         elif b in ('local', 'local_hf', 'hf'):
             if not local_model_path:
                 raise ValueError('local semantic backend requires --semantic_model_path')
-            self.client = LocalHfClient(model_path=local_model_path, max_new_tokens=256)
+            self.client = LocalHfClient(model_path=local_model_path, max_new_tokens=256, load_in_8bit=cfg.llm_quantization == '8bit', load_in_4bit=cfg.llm_quantization == '4bit')
         else:
             raise ValueError(f'Unknown semantic backend: {backend}')
 
@@ -177,9 +218,23 @@ class SemanticEntityExtractor:
             '- Prefer values that appear verbatim in the log message.\n'
             '- No duplicates.\n'
         )
-        out = self.client.chat(prompt)
+        out = self._chat_cached(prompt)
         return parse_semantic_validation_response(out, message=message)
 
+    def _chat_cached(self, prompt: str) -> str:
+        if self.cache_size <= 0:
+            return self.client.chat(prompt)
+        key = hashlib.blake2b(prompt.encode('utf-8'), digest_size=16).digest()
+        out = self._cache.get(key)
+        if out is not None:
+            self._cache.move_to_end(key)
+            return out
+        out = self.client.chat(prompt)
+        self._cache[key] = out
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return out
+
     def extract(self, message: str) -> Set[str]:
         res = self.validate_and_supplement(message=message, candidates=[])
         return set(res.keep) | set(res.add)
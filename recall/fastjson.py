@@ -0,0 +1,34 @@
+from __future__ import annotations
+import json
+from typing import Any, Optional
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def loads(text: str) -> Any:
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(text)
+
+def dumps(obj: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+def dumps_bytes(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def json_object_span(text: str) -> Optional[str]:
+    (_, brace, tail) = (text or '').partition('{')
+    if not brace:
+        return None
+    (body, close, _) = tail.rpartition('}')
+    if not close:
+        return None
+    return '{' + body + '}'
@@ -1,14 +1,15 @@
 from __future__ import annotations
-import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+from .fastjson import json_object_span, loads
 
-@dataclass
+@dataclass(slots=True)
 class LlmDecision:
     label: str
     confidence: float
@@ -41,6 +42,8 @@ class DeepSeekClient:
         self.timeout_sec = int(timeout_sec)
         self.temperature = float(temperature)
         self.max_tokens = int(max_tokens)
+        self.max_connections = int(max_connections)
+        self._headers = {'Authorization': f'Bearer {self.api_key}', 'Content-Type': 'application/json', 'Accept': 'application/json', 'Connection': 'keep-alive'}
         self.session = self._create_session(max_connections=max_connections)
 
     def _create_session(self, max_connections: int) -> requests.Session:
@@ -52,13 +55,21 @@ class DeepSeekClient:
         return s
 
     def chat(self, prompt: str) -> str:
-        headers = {'Authorization': f'Bearer {self.api_key}', 'Content-Type': 'application/json', 'Accept': 'application/json'}
         payload = {'model': self.model, 'stream': False, 'messages': [{'role': 'user', 'content': prompt}], 'temperature': self.temperature, 'max_tokens': self.max_tokens}
-        resp = self.session.post(self.endpoint, headers=headers, json=payload, timeout=self.timeout_sec)
+        resp = self.session.post(self.endpoint, headers=self._headers, json=payload, timeout=self.timeout_sec)
         resp.raise_for_status()
         data = resp.json()
         return self._extract_content(data)
 
+    def chat_batch(self, prompts: List[str], max_workers: Optional[int]=None) -> List[str]:
+        if not prompts:
+            return []
+        workers = max(1, min(len(prompts), int(max_workers or self.max_connections)))
+        if workers == 1:
+            return [self.chat(p) for p in prompts]
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            return list(ex.map(self.chat, prompts))
+
     @staticmethod
     def _extract_content(response: Dict[str, Any]) -> str:
         if isinstance(response, dict):
@@ -79,9 +90,9 @@ def parse_decision(text: str) -> LlmDecision:
     raw = text or ''
     t = raw.strip()
     try:
-        if '{' in t and '}' in t:
-            js = t[t.index('{'):t.rindex('}') + 1]
-            obj = json.loads(js)
+        js = json_object_span(t)
+        if js is not None:
+            obj = loads(js)
             label = str(obj.get('label', 'NORMAL')).strip().upper()
             if label not in ('ANOMALY', 'NORMAL'):
                 label = 'ANOMALY' if 'ANOM' in label else 'NORMAL'
@@ -98,10 +109,12 @@ def parse_decision(text: str) -> LlmDecision:
 
 class LocalHfClient:
 
-    def __init__(self, model_path: str, device: str='auto', dtype: str='auto', max_new_tokens: int=256) -> None:
+    def __init__(self, model_path: str, device: str='auto', dtype: str='auto', max_new_tokens: int=256, load_in_8bit: bool=False, load_in_4bit: bool=False) -> None:
         mp = Path(model_path)
         if not mp.exists():
             raise FileNotFoundError(f'Local HF model_path not found: {model_path}')
+        if load_in_8bit and load_in_4bit:
+            raise ValueError('load_in_8bit and load_in_4bit are mutually exclusive')
         from transformers import AutoModelForCausalLM, AutoTokenizer
         import torch
         self.model_path = str(mp)
@@ -114,7 +127,19 @@ class LocalHfClient:
         torch_dtype = None
         if dtype and dtype != 'auto':
             torch_dtype = getattr(torch, dtype, None)
-        self.model = AutoModelForCausalLM.from_pretrained(self.model_path, trust_remote_code=True, device_map=device_map, torch_dtype=torch_dtype)
+        elif (device or '').lower() != 'cpu' and torch.cuda.is_available() and torch.cuda.is_bf16_supported():
+            torch_dtype = torch.bfloat16
+        quantization_config = None
+        if load_in_8bit or load_in_4bit:
+            from transformers import BitsAndBytesConfig
+            compute_dtype = torch_dtype or (torch.bfloat16 if torch.cuda.is_available() and torch.cuda.is_bf16_supported() else torch.float16)
+            if load_in_4bit:
+                quantization_config = BitsAndBytesConfig(load_in_4bit=True, bnb_4bit_compute_dtype=compute_dtype, bnb_4bit_quant_type='nf4')
+            else:
+                quantization_config = BitsAndBytesConfig(load_in_8bit=True)
+            torch_dtype = compute_dtype
+            device_map = device_map or 'auto'
+        self.model = AutoModelForCausalLM.from_pretrained(self.model_path, trust_remote_code=True, device_map=device_map, torch_dtype=torch_dtype, quantization_config=quantization_config)
         self.model.eval()
         self.device = device
 
@@ -136,9 +161,31 @@ class LocalHfClient:
             tok = {k: v.to(self.model.device) for (k, v) in tok.items()}
         else:
             tok = {k: v.to(self.model.device) for (k, v) in tok.items()}
-        with self.torch.no_grad():
-            out = self.model.generate(**tok, max_new_tokens=self.max_new_tokens, do_sample=False, pad_token_id=getattr(self.tokenizer, 'pad_token_id', None) or getattr(self.tokenizer, 'eos_token_id', None))
+        with self.torch.inference_mode():
+            out = self.model.generate(**tok, max_new_tokens=self.max_new_tokens, do_sample=False, use_cache=True, pad_token_id=self._pad_token_id())
         gen = out[0]
         prompt_len = tok['input_ids'].shape[-1]
         suffix = gen[prompt_len:]
         return self.tokenizer.decode(suffix, skip_special_tokens=True).strip()
+
+    def _pad_token_id(self) -> Optional[int]:
+        return getattr(self.tokenizer, 'pad_token_id', None) or getattr(self.tokenizer, 'eos_token_id', None)
+
+    def chat_batch(self, prompts: List[str]) -> List[str]:
+        if not prompts:
+            return []
+        texts = [self._build_input(p)['text'] for p in prompts]
+        tk = self.tokenizer
+        if getattr(tk, 'pad_token', None) is None and getattr(tk, 'eos_token', None) is not None:
+            tk.pad_token = tk.eos_token
+        padding_side = getattr(tk, 'padding_side', 'right')
+        tk.padding_side = 'left'
+        try:
+            enc = tk(texts, return_tensors='pt', padding=True)
+        finally:
+            tk.padding_side = padding_side
+        enc = {k: v.to(self.model.device) for (k, v) in enc.items()}
+        with self.torch.inference_mode():
+            out = self.model.generate(**enc, max_new_tokens=self.max_new_tokens, do_sample=False, use_cache=True, pad_token_id=self._pad_token_id())
+        prompt_len = enc['input_ids'].shape[-1]
+        return [tk.decode(row[prompt_len:], skip_special_tokens=True).strip() for row in out]
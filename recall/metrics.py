@@ -1,8 +1,9 @@
 from __future__ import annotations
 from dataclasses import dataclass
 from typing import Dict, Iterable, List, Tuple
+_IS_POSITIVE = bytes((1 if i == 1 else 0 for i in range(256)))
 
-@dataclass
+@dataclass(slots=True)
 class Metrics:
     tp: int
     fp: int
@@ -27,7 +28,23 @@ class Metrics:
     def as_dict(self) -> Dict:
         return {'tp': self.tp, 'fp': self.fp, 'tn': self.tn, 'fn': self.fn, 'precision': self.precision, 'recall': self.recall, 'f1': self.f1, 'total': self.tp + self.fp + self.tn + self.fn}
 
+def _positive_mask(labels: List[int]) -> int:
+    return int.from_bytes(bytes(labels).translate(_IS_POSITIVE), 'little')
+
 def compute_metrics(true_labels: List[int], pred_labels: List[int]) -> Metrics:
+    if type(true_labels) is not list or type(pred_labels) is not list:
+        return _compute_metrics_loop(true_labels, pred_labels)
+    n = min(len(true_labels), len(pred_labels))
+    try:
+        t = _positive_mask(true_labels[:n])
+        p = _positive_mask(pred_labels[:n])
+    except (TypeError, ValueError):
+        return _compute_metrics_loop(true_labels, pred_labels)
+    tp = (t & p).bit_count()
+    (t1, p1) = (t.bit_count(), p.bit_count())
+    return Metrics(tp=tp, fp=p1 - tp, tn=n - t1 - p1 + tp, fn=t1 - tp)
+
+def _compute_metrics_loop(true_labels: List[int], pred_labels: List[int]) -> Metrics:
     tp = fp = tn = fn = 0
     for (t, p) in zip(true_labels, pred_labels):
         if t == 1:
@@ -11,14 +11,18 @@ from .llm_client import DeepSeekClient, LocalHfClient, parse_decision
 from .metrics import compute_metrics
 from .packaging import build_evidence_pack
 from .prompt import build_prompt
-from .retrieval import dual_path_retrieve
+from .retrieval import RetrievalState, dual_path_retrieve
 from .trigger import TriggerEngine, severity_level
+_MAX_HELD = 1 << 12
 
 @dataclass
 class PipelineOutputs:
     predictions: List[Dict]
     metrics: Dict
 
+def prediction_label(pred: Dict) -> int:
+    return 1 if pred['prediction']['label'] == 'ANOMALY' else 0
+
 class RecallPipeline:
 
     def __init__(self, cfg: RecallConfig, api_key: Optional[str]=None, api_key_file: Optional[str]=None, enable_llm: bool=True) -> None:
@@ -29,6 +33,7 @@ class RecallPipeline:
         if cfg.enable_semantic_channel:
             self.semantic_extractor = SemanticEntityExtractor(cfg, backend=cfg.semantic_backend, api_key=api_key, api_key_file=api_key_file, local_model_path=cfg.semantic_local_model_path)
         self.trigger = TriggerEngine(cfg)
+        self._prev_retrieval = RetrievalState()
         self.enable_llm = bool(enable_llm)
         self.llm = None
         if self.enable_llm:
@@ -40,45 +45,67 @@ class RecallPipeline:
             elif b in ('local', 'local_hf', 'hf'):
                 if not cfg.llm_local_model_path:
                     raise ValueError('local llm backend requires --llm_model_path')
-                self.llm = LocalHfClient(model_path=cfg.llm_local_model_path, max_new_tokens=256)
+                self.llm = LocalHfClient(model_path=cfg.llm_local_model_path, max_new_tokens=256, load_in_8bit=cfg.llm_quantization == '8bit', load_in_4bit=cfg.llm_quantization == '4bit')
             else:
                 raise ValueError(f'Unknown llm backend: {cfg.llm_backend}')
 
     def process(self, records: List[LogRecord], max_logs: Optional[int]=None) -> PipelineOutputs:
-        preds: List[Dict] = []
-        true_labels: List[int] = []
-        pred_labels: List[int] = []
+        preds = list(self.iter_predictions(records, max_logs=max_logs))
+        m = compute_metrics([p['true_label'] for p in preds], [prediction_label(p) for p in preds])
+        return PipelineOutputs(predictions=preds, metrics=m.as_dict())
+
+    def iter_predictions(self, records: Iterable[LogRecord], max_logs: Optional[int]=None) -> Iterator[Dict]:
+        batch_size = max(1, int(self.cfg.llm_batch_size))
+        held: List[Dict] = []
+        waiting: List[Dict] = []
+        prompts: List[str] = []
         for (i, rec) in enumerate(records):
             if max_logs is not None and i >= int(max_logs):
                 break
             ts = int(rec.ts_sec)
             msg = rec.message or ''
+            trig = self.trigger.check(ts, msg)
             sev = severity_level(self.cfg, msg)
             ent_res = extract_entities(cfg=self.cfg, stat_extractor=self.stat_extractor, ts_sec=ts, message=msg, semantic_extractor=self.semantic_extractor)
             self.graph.add_log(log_id=int(rec.log_id), ts_sec=ts, message=msg, entities=ent_res.final, severity=sev)
             self.graph.tick(ts)
-            trig = self.trigger.check(ts, msg)
             decision = {'label': 'NORMAL', 'confidence': 0.0, 'evidence_ids': [], 'rationale': ''}
             prompt_text = ''
             evidence_items = []
+            use_llm = False
             if trig.triggered:
-                evidence_items = dual_path_retrieve(self.cfg, self.graph, int(rec.log_id))
-                pack = build_evidence_pack(self.cfg, self.graph, int(rec.log_id), evidence_items)
-                pb = build_prompt(self.graph, int(rec.log_id), pack)
-                prompt_text = pb.prompt
-                if self.enable_llm and self.llm is not None:
-                    raw = self.llm.chat(prompt_text)
-                    d = parse_decision(raw)
-                    decision = {'label': d.label, 'confidence': d.confidence, 'evidence_ids': d.evidence_ids, 'rationale': d.rationale, 'llm_error': d.error, 'llm_raw': d.raw}
-                else:
-                    decision['confidence'] = 0.0
-            pred_label_int = 1 if decision['label'] == 'ANOMALY' else 0
+                evidence_items = dual_path_retrieve(self.cfg, self.graph, int(rec.log_id), state=self._prev_retrieval)
+                use_llm = self.enable_llm and self.llm is not None
+                if use_llm or self.cfg.record_prompt_len:
+                    pack = build_evidence_pack(self.cfg, self.graph, int(rec.log_id), evidence_items)
+                    prompt_text = build_prompt(self.graph, int(rec.log_id), pack).prompt
             out = {'log_id': int(rec.log_id), 'timestamp': int(ts), 'message': msg, 'true_label': int(rec.true_label), 'triggered': bool(trig.triggered), 'trigger_by': trig.by, 'severity': int(sev), 'entities_stat': sorted(list(ent_res.estat)), 'entities_stat_validated': sorted(list(ent_res.estat_validated)), 'entities_sem': sorted(list(ent_res.esem)), 'entities_final': sorted(list(ent_res.final)), 'prediction': decision}
             if trig.triggered:
                 out['retrieval'] = {'evidence_count': len(evidence_items), 'evidence_log_ids': [int(e.log_id) for e in evidence_items]}
-                out['prompt_len'] = len(prompt_text)
-            preds.append(out)
-            true_labels.append(int(rec.true_label))
-            pred_labels.append(int(pred_label_int))
-        m = compute_metrics(true_labels, pred_labels)
-        return PipelineOutputs(predictions=preds, metrics=m.as_dict())
+                if prompt_text:
+                    out['prompt_len'] = len(prompt_text)
+            if use_llm:
+                waiting.append(out)
+                prompts.append(prompt_text)
+            if not prompts:
+                yield out
+                continue
+            held.append(out)
+            if len(prompts) >= batch_size or len(held) >= _MAX_HELD:
+                self._resolve_decisions(waiting, prompts)
+                yield from held
+                (held, waiting, prompts) = ([], [], [])
+        if prompts:
+            self._resolve_decisions(waiting, prompts)
+        yield from held
+
+    def _chat_many(self, prompts: List[str]) -> List[str]:
+        chat_batch = getattr(self.llm, 'chat_batch', None)
+        if len(prompts) > 1 and chat_batch is not None:
+            return chat_batch(prompts)
+        return [self.llm.chat(p) for p in prompts]
+
+    def _resolve_decisions(self, outs: List[Dict], prompts: List[str]) -> None:
+        for (out, raw) in zip(outs, self._chat_many(prompts)):
+            d = parse_decision(raw)
+            out['prediction'] = {'label': d.label, 'confidence': d.confidence, 'evidence_ids': d.evidence_ids, 'rationale': d.rationale, 'llm_error': d.error, 'llm_raw': d.raw}
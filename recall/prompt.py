@@ -4,7 +4,7 @@ from typing import List
 from .dynamic_graph import DynamicLogEntityGraph
 from .packaging import EvidencePack
 
-@dataclass
+@dataclass(slots=True)
 class PromptBundle:
     prompt: str
     target_log_id: int
@@ -1,45 +1,41 @@
 from __future__ import annotations
-from collections import deque, defaultdict
-from dataclasses import dataclass
-from typing import Deque, Dict, Iterable, Optional, Set, Tuple
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
 import math
-from .text import unique_tokens
 
 class TokenRecurrenceCounter:
 
     def __init__(self, window_sec: int) -> None:
         self.window_sec = int(window_sec)
         self._q: Deque[Tuple[int, Set[str]]] = deque()
-        self._counts: Dict[str, int] = defaultdict(int)
+        self._counts: Dict[str, int] = {}
 
-    def push(self, ts_sec: int, tokens_in_log: Iterable[str]) -> None:
+    def push(self, ts_sec: int, tok_set: Set[str]) -> None:
         ts = int(ts_sec)
-        tok_set = unique_tokens(tokens_in_log)
         self._q.append((ts, tok_set))
+        counts = self._counts
+        get = counts.get
         for t in tok_set:
-            self._counts[t] += 1
+            counts[t] = get(t, 0) + 1
         self._evict(ts)
 
     def _evict(self, now_ts: int) -> None:
         if self.window_sec <= 0:
             return
         cutoff = int(now_ts) - self.window_sec
-        while self._q and self._q[0][0] < cutoff:
-            (_, tok_set) = self._q.popleft()
+        (q, counts) = (self._q, self._counts)
+        while q and q[0][0] < cutoff:
+            (_, tok_set) = q.popleft()
             for t in tok_set:
-                self._counts[t] -= 1
-                if self._counts[t] <= 0:
-                    self._counts.pop(t, None)
+                n = counts[t] - 1
+                if n:
+                    counts[t] = n
+                else:
+                    del counts[t]
 
     def rf(self, token: str) -> int:
         return int(self._counts.get(token, 0))
 
-@dataclass
-class _EmaStats:
-    mean: float = 0.0
-    var: float = 0.0
-    initialized: bool = False
-
 class TemplateBurstDetector:
 
     def __init__(self, burst_window_sec: int, ema_alpha: float, sigma: float=3.0) -> None:
@@ -47,8 +43,10 @@ class TemplateBurstDetector:
         self.ema_alpha = float(ema_alpha)
         self.sigma = float(sigma)
         self._q: Deque[Tuple[int, str]] = deque()
-        self._win_counts: Dict[str, int] = defaultdict(int)
-        self._ema: Dict[str, _EmaStats] = defaultdict(_EmaStats)
+        self._win_counts: Dict[str, int] = {}
+        self._key_id: Dict[str, int] = {}
+        self._mean: List[float] = []
+        self._var: List[float] = []
 
     def push_and_check(self, ts_sec: int, template_key: str) -> bool:
         ts = int(ts_sec)
@@ -56,21 +54,23 @@ class TemplateBurstDetector:
         if not key:
             return False
         self._q.append((ts, key))
-        self._win_counts[key] += 1
+        self._win_counts[key] = self._win_counts.get(key, 0) + 1
         self._evict(ts)
         x = float(self._win_counts.get(key, 0))
-        st = self._ema[key]
-        a = self.ema_alpha
-        if not st.initialized:
-            st.mean = x
-            st.var = 0.0
-            st.initialized = True
+        kid = self._key_id.get(key)
+        if kid is None:
+            self._key_id[key] = len(self._mean)
+            self._mean.append(x)
+            self._var.append(0.0)
+            (mean, var) = (x, 0.0)
         else:
-            prev_mean = st.mean
-            st.mean = (1.0 - a) * st.mean + a * x
-            st.var = (1.0 - a) * st.var + a * (x - prev_mean) * (x - st.mean)
-        std = math.sqrt(max(st.var, 0.0))
-        threshold = st.mean + self.sigma * std
+            a = self.ema_alpha
+            prev_mean = self._mean[kid]
+            mean = (1.0 - a) * prev_mean + a * x
+            var = (1.0 - a) * self._var[kid] + a * (x - prev_mean) * (x - mean)
+            self._mean[kid] = mean
+            self._var[kid] = var
+        threshold = mean + self.sigma * math.sqrt(max(var, 0.0))
         if threshold <= 1.0:
             return False
         return x > threshold
@@ -79,8 +79,11 @@ class TemplateBurstDetector:
         if self.burst_window_sec <= 0:
             return
         cutoff = int(now_ts) - self.burst_window_sec
-        while self._q and self._q[0][0] < cutoff:
-            (_, key) = self._q.popleft()
-            self._win_counts[key] -= 1
-            if self._win_counts[key] <= 0:
-                self._win_counts.pop(key, None)
+        (q, counts) = (self._q, self._win_counts)
+        while q and q[0][0] < cutoff:
+            (_, key) = q.popleft()
+            n = counts[key] - 1
+            if n:
+                counts[key] = n
+            else:
+                del counts[key]
@@ -1,12 +1,13 @@
 from __future__ import annotations
+import heapq
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Set, Tuple
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
 from .config import RecallConfig
 from .dynamic_graph import DynamicLogEntityGraph
-from .text import normalize_message_for_dedup
-from .trigger import severity_level
+PATH_STRUCT = 1
+PATH_TIME = 2
 
-@dataclass
+@dataclass(slots=True)
 class EvidenceItem:
     log_id: int
     ts_sec: int
@@ -15,10 +16,14 @@ class EvidenceItem:
     dist: int
     score: float
     edge_weight: float
-    paths: Set[str] = field(default_factory=set)
+    paths_mask: int = 0
     shared_entities: List[str] = field(default_factory=list)
     time_offset: Optional[int] = None
 
+    @property
+    def paths(self) -> Set[str]:
+        return {name for (bit, name) in ((PATH_STRUCT, 'struct'), (PATH_TIME, 'time')) if self.paths_mask & bit}
+
 def _min_dist(a: Optional[int], b: Optional[int]) -> int:
     if a is None:
         return int(b) if b is not None else 999999
@@ -26,117 +31,97 @@ def _min_dist(a: Optional[int], b: Optional[int]) -> int:
         return int(a)
     return int(min(a, b))
 
-def _temporal_path_min_edge_weight(g: DynamicLogEntityGraph, src: int, dst: int, now_ts: int) -> float:
-    if src == dst:
-        return 1.0
-    w_min = 1.0
-    cur = dst
-    visited = 0
-    while cur != src and visited < 2048:
-        ln = g.get_log(cur)
-        if ln is None or ln.prev_log_id is None:
-            break
-        prev = ln.prev_log_id
-        w = g.temporal_edge_weight(prev, cur, now_ts)
-        w_min = min(w_min, w)
-        cur = prev
-        visited += 1
-    if cur == src:
-        return w_min
-    w_min = 1.0
-    cur = src
-    visited = 0
-    while cur != dst and visited < 2048:
-        ln = g.get_log(cur)
-        if ln is None or ln.next_log_id is None:
-            break
-        nxt = ln.next_log_id
-        w = g.temporal_edge_weight(cur, nxt, now_ts)
-        w_min = min(w_min, w)
-        cur = nxt
-        visited += 1
-    if cur == dst:
-        return w_min
-    return 0.0
+def _rank_key(item: Tuple[float, int, int, int, int, float]) -> Tuple[float, int, int]:
+    return (item[0], item[1], -item[2])
 
-def dual_path_retrieve(cfg: RecallConfig, g: DynamicLogEntityGraph, target_log_id: int) -> List[EvidenceItem]:
-    tgt = g.get_log(target_log_id)
-    if tgt is None:
-        return []
-    now_ts = int(tgt.ts_sec)
-    eq = g.get_entities_for_log(target_log_id)
-    cand_dist_time: Dict[int, int] = {}
-    cand_dist_struct: Dict[int, int] = {}
-    shared_entities: Dict[int, Set[str]] = {}
-    for e in eq:
-        if g.entity_degree(e) > int(cfg.degree_threshold_dmax):
-            continue
-        for lid in g.get_logs_for_entity(e):
-            if lid == target_log_id:
+@dataclass(slots=True)
+class RetrievalState:
+    entities: FrozenSet[int] = frozenset()
+    skipped: FrozenSet[int] = frozenset()
+    row: int = -1
+    epoch: int = -1
+    since_ts: Optional[int] = None
+    shared: Dict[int, Set[int]] = field(default_factory=dict)
+
+def _struct_candidates(cfg: RecallConfig, g: DynamicLogEntityGraph, eq: Set[int], since_ts: Optional[int], state: Optional[RetrievalState]) -> Dict[int, Set[int]]:
+    dmax = int(cfg.degree_threshold_dmax)
+    ents = frozenset(eq)
+    skipped = frozenset((e for e in ents if g.entity_id_degree(e) > dmax))
+    end = g.end_row
+    epoch = g.edge_epoch
+    if state is not None and state.entities == ents and state.skipped == skipped and state.epoch == epoch and state.since_ts == since_ts and 0 <= state.row <= end:
+        live = ents - skipped
+        shared = state.shared
+        for (lid, ts, lents) in g.logs_in_rows(state.row, end):
+            if since_ts is not None and ts < since_ts:
+                continue
+            common = live.intersection(lents)
+            if common:
+                if lid in shared:
+                    shared[lid].update(common)
+                else:
+                    shared[lid] = set(common)
+    else:
+        shared = {}
+        for e in ents:
+            if e in skipped:
                 continue
-            cand_dist_struct[lid] = _min_dist(cand_dist_struct.get(lid), 2)
-            shared_entities.setdefault(lid, set()).add(e)
-    k = int(cfg.temporal_k)
-    cur = target_log_id
-    for d in range(1, k + 1):
-        ln = g.get_log(cur)
-        if ln is None or ln.prev_log_id is None:
-            break
-        cur = ln.prev_log_id
-        cand_dist_time[cur] = min(cand_dist_time.get(cur, 10 ** 9), d)
-    cur = target_log_id
-    for d in range(1, k + 1):
-        ln = g.get_log(cur)
-        if ln is None or ln.next_log_id is None:
-            break
-        cur = ln.next_log_id
-        cand_dist_time[cur] = min(cand_dist_time.get(cur, 10 ** 9), d)
+            for lid in g.recent_logs_for_entity_id(e, since_ts):
+                shared.setdefault(lid, set()).add(e)
+    if state is not None:
+        (state.entities, state.skipped, state.row, state.epoch, state.since_ts, state.shared) = (ents, skipped, end, epoch, since_ts, shared)
+    return shared
+
+def dual_path_retrieve(cfg: RecallConfig, g: DynamicLogEntityGraph, target_log_id: int, state: Optional[RetrievalState]=None) -> List[EvidenceItem]:
+    tgt_ts = g.log_ts(target_log_id)
+    if tgt_ts is None:
+        return []
+    now_ts = int(tgt_ts)
+    eq = g.entity_ids_for_log(target_log_id)
+    cand_dist_time = g.temporal_neighbors(target_log_id, int(cfg.temporal_k))
+    since_ts = now_ts - int(cfg.graph_window_t_sec) if cfg.graph_window_t_sec > 0 else None
+    shared_entities = _struct_candidates(cfg, g, eq, since_ts, state)
+    cand_dist_struct = dict.fromkeys(shared_entities, 2)
+    cand_dist_struct.pop(target_log_id, None)
     cand_ids = set(cand_dist_struct.keys()) | set(cand_dist_time.keys())
-    msg2best: Dict[str, int] = {}
+    msg2best: Dict[int, int] = {}
     for lid in cand_ids:
-        ln = g.get_log(lid)
-        if ln is None:
+        ts = g.log_ts(lid)
+        if ts is None:
             continue
-        key = normalize_message_for_dedup(ln.message, case_insensitive=cfg.dedup_case_insensitive)
-        if not key:
+        key = g.dedup_key(lid)
+        if key is None:
             continue
         prev = msg2best.get(key)
         if prev is None:
             msg2best[key] = lid
         else:
-            a = g.get_log(prev)
-            if a is None or ln.ts_sec > a.ts_sec:
+            a_ts = g.log_ts(prev)
+            if a_ts is None or ts > a_ts or (ts == a_ts and lid < prev):
                 msg2best[key] = lid
     dedup_ids = set(msg2best.values())
-    items: List[EvidenceItem] = []
+    w_target = g.log_edge_weight(target_log_id, now_ts)
+    w_struct = dict(zip(dedup_ids, g.edge_weights_bulk(dedup_ids, now_ts)))
+    (a, b, c) = (cfg.score_a, cfg.score_b, cfg.score_c)
+    scored: List[Tuple[float, int, int, int, int, float]] = []
+    append = scored.append
     for lid in dedup_ids:
-        ln = g.get_log(lid)
-        if ln is None:
+        ts = g.log_ts(lid)
+        if ts is None:
             continue
-        dist = _min_dist(cand_dist_struct.get(lid), cand_dist_time.get(lid))
-        dist = max(1, int(dist))
-        sev = int(ln.severity)
-        if sev == 0:
-            sev = severity_level(cfg, ln.message)
+        dist = max(1, _min_dist(cand_dist_struct.get(lid), cand_dist_time.get(lid)))
+        sev = int(g.log_severity(lid))
         w = 0.0
         if lid in cand_dist_time:
-            w = max(w, _temporal_path_min_edge_weight(g, target_log_id, lid, now_ts))
-        if lid in cand_dist_struct:
-            best = 0.0
-            for e in shared_entities.get(lid, set()):
-                w0 = g.structural_edge_weight(target_log_id, e, now_ts)
-                wi = g.structural_edge_weight(lid, e, now_ts)
-                best = max(best, min(w0, wi))
-            w = max(w, best)
-        score = cfg.score_a * float(sev) + cfg.score_b * (1.0 / float(dist)) + cfg.score_c * float(w)
-        paths: Set[str] = set()
+            w = max(w, g.temporal_path_min_edge_weight(target_log_id, lid, now_ts))
         if lid in cand_dist_struct:
-            paths.add('struct')
-        if lid in cand_dist_time:
-            paths.add('time')
-        item = EvidenceItem(log_id=lid, ts_sec=int(ln.ts_sec), message=ln.message, severity=int(sev), dist=int(dist), score=float(score), edge_weight=float(w), paths=paths, shared_entities=sorted(list(shared_entities.get(lid, set()))))
-        if lid in cand_dist_time:
-            item.time_offset = int(ln.ts_sec) - int(tgt.ts_sec)
-        items.append(item)
-    items.sort(key=lambda x: (x.score, x.ts_sec), reverse=True)
-    return items[:int(cfg.evidence_budget_nmax)]
+            if shared_entities.get(lid):
+                w = max(w, min(w_target, w_struct[lid]))
+        append((a * float(sev) + b * (1.0 / float(dist)) + c * float(w), int(ts), lid, sev, dist, w))
+    top = heapq.nlargest(max(0, int(cfg.evidence_budget_nmax)), scored, key=_rank_key)
+    items: List[EvidenceItem] = []
+    for (score, ts, lid, sev, dist, w) in top:
+        in_time = lid in cand_dist_time
+        mask = (PATH_STRUCT if lid in cand_dist_struct else 0) | (PATH_TIME if in_time else 0)
+        items.append(EvidenceItem(log_id=lid, ts_sec=ts, message=g.log_message(lid), severity=sev, dist=dist, score=float(score), edge_weight=float(w), paths_mask=mask, shared_entities=sorted((g.entity_value(e) for e in shared_entities.get(lid, ()))), time_offset=ts - now_ts if in_time else None))
+    return items
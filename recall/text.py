@@ -1,21 +1,21 @@
 from __future__ import annotations
 import re
-from typing import Iterable, List, Set
+from typing import Dict, List
 _WS = re.compile('\\s+')
+_HEX = re.compile('\\b0x[0-9a-f]+\\b')
+_NUM = re.compile('\\b\\d+\\b')
 
 def normalize_message_for_dedup(msg: str, case_insensitive: bool) -> str:
-    s = (msg or '').strip()
+    s = msg or ''
     if case_insensitive:
         s = s.lower()
-    s = _WS.sub(' ', s)
-    return s
+    return ' '.join(s.split())
 
 def mask_for_template_key(msg: str) -> str:
-    s = (msg or '').strip().lower()
-    s = re.sub('\\b0x[0-9a-f]+\\b', '<HEX>', s)
-    s = re.sub('\\b\\d+\\b', '<NUM>', s)
-    s = _WS.sub(' ', s)
-    return s
+    s = ' '.join((msg or '').lower().split())
+    if '0x' in s:
+        s = _HEX.sub('<HEX>', s)
+    return _NUM.sub('<NUM>', s)
 
 def tokenize_for_entity_candidates(msg: str) -> List[str]:
     if not msg:
@@ -33,11 +33,28 @@ def tokenize_for_entity_candidates(msg: str) -> List[str]:
             out.append(t)
     return out
 
+def _ascii_type_table(case_sensitive: bool) -> Dict[int, str]:
+    table: Dict[int, str] = {}
+    for i in range(128):
+        ch = chr(i)
+        if ch.isdigit():
+            table[i] = '0'
+        elif ch.isalpha():
+            table[i] = '3' if (case_sensitive and ch.isupper()) else '1'
+        else:
+            table[i] = '2'
+    return table
+_TYPE_TABLE = _ascii_type_table(case_sensitive=False)
+_TYPE_TABLE_CS = _ascii_type_table(case_sensitive=True)
+
 def token_complexity(token: str, case_sensitive: bool=False) -> int:
     if not token:
         return 0
     if len(token) < 2:
         return 0
+    if token.isascii():
+        t = token.translate(_TYPE_TABLE_CS if case_sensitive else _TYPE_TABLE)
+        return sum((1 for (a, b) in zip(t, t[1:]) if a != b))
 
     def _t(ch: str) -> int:
         if ch.isdigit():
@@ -54,6 +71,3 @@ def token_complexity(token: str, case_sensitive: bool=False) -> int:
             tc += 1
         last_type = cur
     return int(tc)
-
-def unique_tokens(tokens: Iterable[str]) -> Set[str]:
-    return set((t for t in tokens if t))
@@ -6,18 +6,9 @@ from .recurrence import TemplateBurstDetector
 from .text import mask_for_template_key
 
 def severity_level(cfg: RecallConfig, message: str) -> int:
-    s = (message or '').lower()
-    for kw in cfg.severity_keywords_fatal:
-        if kw in s:
-            return 3
-    for kw in cfg.severity_keywords_error:
-        if kw in s:
-            return 2
-    if 'warn' in s or 'warning' in s:
-        return 1
-    return 0
+    return cfg.severity_of(message)
 
-@dataclass
+@dataclass(slots=True)
 class TriggerDecision:
     triggered: bool
     by: str
@@ -32,8 +23,7 @@ class TriggerEngine:
     def check(self, ts_sec: int, message: str) -> TriggerDecision:
         msg = message or ''
         if self.cfg.enable_severity_trigger:
-            low = msg.lower()
-            if any((kw in low for kw in self.cfg.trigger_keywords or [])):
+            if self.cfg.has_trigger(msg):
                 return TriggerDecision(triggered=True, by='severity', template_key=None)
         if self.cfg.enable_burst_trigger:
             key = mask_for_template_key(msg)
@@ -3,11 +3,15 @@ import argparse
 import json
 import os
 from pathlib import Path
+from typing import List
 import sys
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 from recall.config import RecallConfig
 from recall.data import load_dataset
-from recall.pipeline import RecallPipeline
+from recall.fastjson import dumps_bytes
+from recall.metrics import compute_metrics
+from recall.pipeline import RecallPipeline, prediction_label
+_WRITE_CHUNK = 1 << 20
 
 def main() -> None:
     p = argparse.ArgumentParser(description='Run RECALL paper-aligned online pipeline (Algorithm 1/2).')
@@ -23,6 +27,9 @@ def main() -> None:
     p.add_argument('--semantic_model_path', default=None, help='Local HF model path for semantic channel (when semantic_backend=local_hf)')
     p.add_argument('--llm_backend', choices=['deepseek_api', 'local_hf'], default='deepseek_api', help='Decision LLM backend')
     p.add_argument('--llm_model_path', default=None, help='Local HF model path for decision LLM (when llm_backend=local_hf)')
+    p.add_argument('--llm_quantization', choices=['8bit', '4bit'], default=None, help='Load local HF models quantized via bitsandbytes')
+    p.add_argument('--llm_batch_size', type=int, default=1, help='Number of triggered prompts sent to the decision LLM per batch (concurrent API requests or one padded generate call)')
+    p.add_argument('--record_prompt_len', action='store_true', help='Build prompts and record prompt_len even when LLM inference is disabled')
     p.add_argument('--theta_tc', type=int, default=2)
     p.add_argument('--theta_rf', type=int, default=2)
     p.add_argument('--delta_t_sec', type=int, default=300)
@@ -35,20 +42,30 @@ def main() -> None:
     args = p.parse_args()
     out_dir = Path(args.output_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
-    cfg = RecallConfig(theta_tc=int(args.theta_tc), theta_rf=int(args.theta_rf), delta_t_sec=int(args.delta_t_sec), graph_window_t_sec=int(args.graph_window_t_sec), temporal_k=int(args.temporal_k), evidence_budget_nmax=int(args.evidence_budget_nmax), degree_threshold_dmax=int(args.degree_threshold_dmax), decay_lambda=None if args.decay_lambda is None else float(args.decay_lambda), theta_w=float(args.theta_w), enable_semantic_channel=bool(args.enable_semantic_channel), semantic_backend=str(args.semantic_backend), semantic_local_model_path=args.semantic_model_path, llm_backend=str(args.llm_backend), llm_local_model_path=args.llm_model_path)
+    cfg = RecallConfig(theta_tc=int(args.theta_tc), theta_rf=int(args.theta_rf), delta_t_sec=int(args.delta_t_sec), graph_window_t_sec=int(args.graph_window_t_sec), temporal_k=int(args.temporal_k), evidence_budget_nmax=int(args.evidence_budget_nmax), degree_threshold_dmax=int(args.degree_threshold_dmax), decay_lambda=None if args.decay_lambda is None else float(args.decay_lambda), theta_w=float(args.theta_w), enable_semantic_channel=bool(args.enable_semantic_channel), semantic_backend=str(args.semantic_backend), semantic_local_model_path=args.semantic_model_path, llm_backend=str(args.llm_backend), llm_local_model_path=args.llm_model_path, llm_quantization=args.llm_quantization, llm_batch_size=int(args.llm_batch_size), record_prompt_len=bool(args.record_prompt_len))
     records = load_dataset(args.dataset, loghub_root=args.loghub_root)
     pipe = RecallPipeline(cfg=cfg, api_key=args.api_key, api_key_file=args.api_key_file, enable_llm=not args.no_llm)
-    outputs = pipe.process(records, max_logs=args.max_logs)
     preds_path = out_dir / 'predictions.jsonl'
-    with open(preds_path, 'w', encoding='utf-8') as w:
-        for rec in outputs.predictions:
-            w.write(json.dumps(rec, ensure_ascii=False) + '\n')
+    true_labels: List[int] = []
+    pred_labels: List[int] = []
+    with open(preds_path, 'wb', buffering=_WRITE_CHUNK) as w:
+        buf = bytearray()
+        for rec in pipe.iter_predictions(records, max_logs=args.max_logs):
+            true_labels.append(rec['true_label'])
+            pred_labels.append(prediction_label(rec))
+            buf += dumps_bytes(rec)
+            buf += b'\n'
+            if len(buf) >= _WRITE_CHUNK:
+                w.write(buf)
+                buf.clear()
+        w.write(buf)
+    metrics = compute_metrics(true_labels, pred_labels).as_dict()
     metrics_path = out_dir / 'metrics.json'
     with open(metrics_path, 'w', encoding='utf-8') as w:
-        json.dump(outputs.metrics, w, ensure_ascii=False, indent=2)
-    print(f'✅ Done. Wrote {len(outputs.predictions):,} predictions')
+        json.dump(metrics, w, ensure_ascii=False, indent=2)
+    print(f'✅ Done. Wrote {len(true_labels):,} predictions')
     print(f'   Predictions: {preds_path}')
     print(f'   Metrics:     {metrics_path}')
-    print(f"   F1={outputs.metrics.get('f1'):.4f} P={outputs.metrics.get('precision'):.4f} R={outputs.metrics.get('recall'):.4f}")
+    print(f"   F1={metrics.get('f1'):.4f} P={metrics.get('precision'):.4f} R={metrics.get('recall'):.4f}")
 if __name__ == '__main__':
     main()
@@ -0,0 +1,54 @@
+from __future__ import annotations
+import random
+import unittest
+from recall.config import RecallConfig
+from recall.dynamic_graph import DynamicLogEntityGraph
+
+def _walk_min_edge_weight(g: DynamicLogEntityGraph, src: int, dst: int, now_ts: int) -> float:
+    if src == dst:
+        return 1.0
+    for (first, last) in ((src, dst), (dst, src)):
+        (w_min, cur) = (1.0, last)
+        while cur != first:
+            prev = g.prev_log_id(cur)
+            if prev is None:
+                break
+            w_min = min(w_min, g.temporal_edge_weight(prev, cur, now_ts))
+            cur = prev
+        if cur == first:
+            return w_min
+    return 0.0
+
+class TemporalPathMinEdgeWeightTest(unittest.TestCase):
+
+    def _check(self, cfg: RecallConfig, monotone: bool, seed: int) -> DynamicLogEntityGraph:
+        rng = random.Random(seed)
+        g = DynamicLogEntityGraph(cfg)
+        ts = 1000
+        for lid in range(4000):
+            ts += rng.choice((0, 0, 1, 2, 3, 40)) if monotone else rng.randint(-3, 4)
+            g.add_log(lid, ts, f'm{lid % 7}', [f'e{rng.randint(0, 50)}'], 0)
+            g.tick(ts)
+            for _ in range(4):
+                (a, b) = (lid - rng.randint(0, 300), lid - rng.randint(0, 300))
+                self.assertEqual(g.temporal_path_min_edge_weight(a, b, ts), _walk_min_edge_weight(g, a, b, ts), (lid, a, b))
+        return g
+
+    def test_monotone_matches_pointer_walk_across_pruning_and_compaction(self) -> None:
+        for kw in ({}, {'decay_lambda': 0.05}, {'theta_w': 0.0}):
+            g = self._check(RecallConfig(graph_window_t_sec=200, **kw), monotone=True, seed=1)
+            self.assertTrue(g._ts_monotone)
+            self.assertGreater(g._row_base, 0)
+
+    def test_edges_pruned_before_eviction(self) -> None:
+        g = self._check(RecallConfig(graph_window_t_sec=200, decay_lambda=0.05), monotone=True, seed=2)
+        self.assertGreater(g._pruned_row, g._row_base + g._head)
+
+    def test_non_monotone_matches_pointer_walk(self) -> None:
+        for kw in ({}, {'decay_lambda': 0.05}):
+            g = self._check(RecallConfig(graph_window_t_sec=200, **kw), monotone=False, seed=3)
+            self.assertFalse(g._ts_monotone)
+            self.assertGreater(g._row_base, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,23 @@
+from __future__ import annotations
+import array
+import random
+import unittest
+from recall.metrics import _compute_metrics_loop, compute_metrics
+
+class ComputeMetricsTest(unittest.TestCase):
+
+    def test_matches_loop_for_non_list_inputs(self) -> None:
+        (t, p) = ([1, 0, 1, 1], [1, 1, 0, 1])
+        expected = _compute_metrics_loop(t, p)
+        for (tl, pl) in ((array.array('q', t), p), (tuple(t), tuple(p)), (iter(t), (x for x in p)), ([1, 0, True, 1], [1, 1, 0.0, 1])):
+            self.assertEqual(compute_metrics(tl, pl), expected)
+
+    def test_matches_loop_on_random_lists(self) -> None:
+        rng = random.Random(0)
+        for n in (0, 1, 7, 1000):
+            t = [rng.choice((0, 1, 1, 2, -1, 300)) for _ in range(n)]
+            p = [rng.choice((0, 1)) for _ in range(n + rng.randint(0, 3))]
+            self.assertEqual(compute_metrics(t, p), _compute_metrics_loop(t, p))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+from __future__ import annotations
+import random
+import unittest
+from recall.config import RecallConfig
+from recall.dynamic_graph import DynamicLogEntityGraph
+from recall.retrieval import RetrievalState, dual_path_retrieve
+
+def _evidence(items):
+    return [(e.log_id, e.ts_sec, e.score, e.dist, e.edge_weight, e.paths_mask, e.shared_entities, e.time_offset) for e in items]
+
+class StatefulRetrievalTest(unittest.TestCase):
+
+    def _run(self, cfg: RecallConfig, seed: int, monotone: bool=True) -> int:
+        rng = random.Random(seed)
+        g = DynamicLogEntityGraph(cfg)
+        state = RetrievalState()
+        (ts, reused) = (1000, 0)
+        for lid in range(3000):
+            ts += rng.choice((0, 0, 0, 1, 2, 30)) if monotone else rng.randint(-2, 3)
+            ents = rng.sample(('a', 'b', 'c', 'd', 'e'), rng.randint(0, 2)) if rng.random() < 0.9 else [f'x{lid}']
+            g.add_log(lid, ts, f'msg {rng.randint(0, 20)}', ents, rng.randint(0, 3))
+            g.tick(ts)
+            if rng.random() < 0.5:
+                continue
+            target = lid if rng.random() < 0.7 else rng.randint(max(0, lid - 50), lid)
+            if state.entities == frozenset(g.entity_ids_for_log(target)) and state.epoch == g.edge_epoch:
+                reused += 1
+            self.assertEqual(_evidence(dual_path_retrieve(cfg, g, target, state=state)), _evidence(dual_path_retrieve(cfg, g, target)), target)
+        return reused
+
+    def test_matches_stateless_retrieval(self) -> None:
+        self.assertGreater(self._run(RecallConfig(graph_window_t_sec=300), seed=1), 0)
+
+    def test_matches_with_degree_cutoff_and_edge_pruning(self) -> None:
+        self.assertGreater(self._run(RecallConfig(graph_window_t_sec=300, degree_threshold_dmax=8, decay_lambda=0.05, evidence_budget_nmax=5), seed=2), 0)
+
+    def test_matches_without_window_or_decay(self) -> None:
+        self._run(RecallConfig(graph_window_t_sec=0, theta_w=0.0, evidence_budget_nmax=10), seed=3)
+
+    def test_matches_on_non_monotone_timestamps(self) -> None:
+        self._run(RecallConfig(graph_window_t_sec=300, activity_epsilon=0.5), seed=4, monotone=False)
+
+    def _assert_same(self, cfg: RecallConfig, g: DynamicLogEntityGraph, lid: int, state: RetrievalState) -> None:
+        self.assertEqual(_evidence(dual_path_retrieve(cfg, g, lid, state=state)), _evidence(dual_path_retrieve(cfg, g, lid)))
+
+    def test_entity_pruning_invalidates_state(self) -> None:
+        cfg = RecallConfig(graph_window_t_sec=300, activity_beta=0.5, activity_epsilon=1.5)
+        g = DynamicLogEntityGraph(cfg)
+        state = RetrievalState()
+        for lid in range(3):
+            g.add_log(lid, 100, f'm{lid}', ['a'], 0)
+        self._assert_same(cfg, g, 2, state)
+        self.assertTrue(state.shared)
+        lid = 3
+        while g.step % 256:
+            g.add_log(lid, 100, f'm{lid}', [], 0)
+            g.tick(100)
+            lid += 1
+        g.add_log(lid, 100, 'target', ['a'], 0)
+        self.assertEqual(state.entities, frozenset(g.entity_ids_for_log(lid)))
+        self._assert_same(cfg, g, lid, state)
+
+    def test_late_rows_outside_the_window_are_skipped(self) -> None:
+        cfg = RecallConfig(graph_window_t_sec=300, decay_lambda=0.001)
+        g = DynamicLogEntityGraph(cfg)
+        state = RetrievalState()
+        for (lid, ts) in ((0, 900), (1, 1000)):
+            g.add_log(lid, ts, f'm{lid}', ['a'], 0)
+            g.tick(ts)
+        self._assert_same(cfg, g, 1, state)
+        for (lid, ts) in ((2, 600), (3, 1000)):
+            g.add_log(lid, ts, f'm{lid}', ['a'], 0)
+            g.tick(ts)
+        self.assertEqual(g.log_ts(2), 600)
+        self._assert_same(cfg, g, 3, state)
+
+    def test_older_targets_reuse_state(self) -> None:
+        cfg = RecallConfig(graph_window_t_sec=300, temporal_k=0)
+        g = DynamicLogEntityGraph(cfg)
+        state = RetrievalState()
+        for lid in range(10):
+            g.add_log(lid, 100, f'm{lid}', ['a'], 0)
+        for lid in (5, 7, 9, 2):
+            self._assert_same(cfg, g, lid, state)
+        self.assertEqual([e.log_id for e in dual_path_retrieve(cfg, g, 7, state=state)], [0, 1, 2, 3, 4, 5, 6, 8, 9])
+        g.add_log(10, 100, 'm10', ['a'], 0)
+        self._assert_same(cfg, g, 3, state)
+        self.assertIn(10, [e.log_id for e in dual_path_retrieve(cfg, g, 4, state=state)])
+
+    def test_ties_prefer_the_smaller_log_id(self) -> None:
+        cfg = RecallConfig(graph_window_t_sec=0, theta_w=0.0, temporal_k=0, evidence_budget_nmax=2)
+        g = DynamicLogEntityGraph(cfg)
+        for lid in (5, 3, 9, 7):
+            g.add_log(lid, 100, f'm{lid}', ['a'], 0)
+        g.add_log(11, 100, 'dup', ['a'], 0)
+        g.add_log(10, 100, 'dup', ['a'], 0)
+        g.add_log(1, 100, 'target', ['a'], 0)
+        self.assertEqual([e.log_id for e in dual_path_retrieve(cfg, g, 1)], [3, 5])
+        self.assertIn(10, [e.log_id for e in dual_path_retrieve(RecallConfig(graph_window_t_sec=0, theta_w=0.0, temporal_k=0), g, 1)])
+
+if __name__ == '__main__':
+    unittest.main()